@@ -3,324 +3,198 @@
 from __future__ import annotations
 
 import argparse
-import csv
-from datetime import datetime, time
+import calendar
+import os
+import pickle
+from dataclasses import dataclass
+from datetime import datetime
+from functools import cached_property, lru_cache
+from operator import itemgetter
+from pathlib import Path
 from typing import Callable, List, Tuple, cast
 
+import numpy as np
+
 parser = argparse.ArgumentParser()
 parser.add_argument("prices_file", help="Path to prices CSV file")
+parser.add_argument("--no-cache", action="store_true", help="Re-parse the prices file without reading or writing the cache")
 
 args = parser.parse_args()
 
-class Provider:
-    
-    def get_variable_price(self, date: datetime) -> float:
-        raise NotImplementedError()
+# price attribute for each letter used in a provider's tariff bands
+BANDS = {'V': 'VARIABLE', 'P': 'PEAK', 'O': 'OFF_PEAK', 'S': 'SHOULDER', 'N': 'NIGHT', 'F': 'FREE'}
 
-    def get_fixed_price(self, date: datetime) -> float:
-        raise NotImplementedError()
-
-    def calculate_daily_total(self, half_hour_totals: list[float]) -> float:
-        return sum(half_hour_totals)
+class Provider:
 
-    def calculate_total(self, subtotal: float) -> float:
-        return subtotal
+    # prices in cents, FIXED per day and the rest per kWh in each tariff band
+    FIXED: float
+    VARIABLE: float
+    FREE = 0
+
+    # tariff band for each hour of the day from midnight, spaces between each six hours are ignored
+    WEEKDAY = 'VVVVVV VVVVVV VVVVVV VVVVVV'
+    # same as weekdays unless set
+    WEEKEND: str | None = None
+
+    # whether the most expensive off peak hour each day is free
+    FREE_HOUR = False
+
+    # adjustments to the total cost, total * SCALE + OFFSET
+    SCALE = 1
+    OFFSET = 0
+
+    def __init__(self, low_user: bool = False, name: str | None = None, **prices: float):
+        # a low user plan is the same tariff with different prices
+        self.low_user = low_user
+        self._name = name
+        # only prices this tariff actually uses, so a typo can't leave the base price in place
+        used = {'FIXED'} | {BANDS.get(band) for band in self.WEEKDAY + (self.WEEKEND or '')}
+        for price_name, price in prices.items():
+            if price_name not in used:
+                raise TypeError(f'{type(self).__name__} has no {price_name} price')
+            setattr(self, price_name, price)
+
+    @property
+    def name(self) -> str:
+        return self._name or type(self).__name__ + ('LowUser' if self.low_user else '')
+
+    @cached_property
+    def price_table(self) -> np.ndarray:
+        # variable price for each half hour slot of the week (weekday * 48 + half hour), from Monday
+        week = (self.WEEKDAY * 5 + (self.WEEKEND or self.WEEKDAY) * 2).replace(' ', '')
+        if len(week) != 7 * 24:
+            raise ValueError(f'{self.name} tariff bands should have a letter for each hour of the day')
+
+        # band letter -> price lookup, so the whole week is a single gather
+        prices = np.zeros(128, dtype=np.float32)
+        for band in set(week):
+            prices[ord(band)] = getattr(self, BANDS[band])
+        return prices[np.frombuffer(week.encode(), dtype=np.uint8).repeat(2)]
     
 PROVIDERS: list[Provider] = []
 
 
 # class Powershop(Provider):
 
-#     def get_variable_price(self, date: datetime) -> float:
+#     # Price table from https://secure.powershop.co.nz/properties/388311/rates
+#     PRICES = """Apr	May	Jun	Jul	Aug	Sep	Oct	Nov	Dec	Jan	Feb	Mar
+#         16.49	17.21	16.96	16.64	16.11	15.11	14.58	13.88	13.51	13.98	14.12	15.35
+#         25.4	26.12	25.87	25.55	25.02	24.02	23.49	22.79	22.42	22.89	23.03	24.27"""
+#     OFF_PEAK = [float(price) for price in PRICES.split('\n')[1].split()]
+#     PEAK = [float(price) for price in PRICES.split('\n')[2].split()]
+#     FIXED = 215.05
 
-#         # Price table from https://secure.powershop.co.nz/properties/388311/rates
-#         prices = """Apr	May	Jun	Jul	Aug	Sep	Oct	Nov	Dec	Jan	Feb	Mar
-#             16.49	17.21	16.96	16.64	16.11	15.11	14.58	13.88	13.51	13.98	14.12	15.35
-#             25.4	26.12	25.87	25.55	25.02	24.02	23.49	22.79	22.42	22.89	23.03	24.27"""
-#         lines = prices.split('\n')
-#         months = lines[0].split()
-#         off_peak = lines[1].split()
-#         peak = lines[2].split()
+#     # NB prices vary by month (the table starts in April), price_table would need a table per month before
+#     # this can be re-enabled
+#     WEEKDAY = 'OOOOOO OPPPPO OOOOOP PPPOOO'
+#     WEEKEND = 'OOOOOO OOOOOO OOOOOO OOOOOO'
 
-#         month = months.index(date.strftime('%b'))
-#         day_of_week = date.weekday()
-
-#         if day_of_week < 5: # weekdays only
-#             if (date.time() >= time(7, 0) and date.time() < time(11, 0)) or \
-#                 (date.time() >= time(17, 0) and date.time() < time(21, 0)):
-#                 # Peak
-#                 return float(peak[month])
-#         # else offpeak
-#         return float(off_peak[month])
-
-#     def get_fixed_price(self, _date: datetime) -> float:
-#         return 215.05
-
-#     def calculate_total(self, subtotal: float) -> float:
-#         # assume 1% discount
-#         return subtotal * 0.99
+#     # assume 1% discount
+#     SCALE = 0.99
 
 
 class Contact(Provider):
 
-    def calculate_total(self, subtotal: float) -> float:
-        # credit card fee
-        return subtotal * 1.0095
+    # credit card fee
+    SCALE = 1.0095
 
 class ContactGoodNights(Contact):
 
-    def get_non_free_variable_price(self) -> float:
-        return 22.54
+    VARIABLE = 22.54
+    FIXED = 240.6
 
-    def get_variable_price(self, date: datetime) -> float:
-        # free power 9pm to midnight
-        if date.time() >= time(21, 0) and date.time() <= time(23, 59):
-            return 0
-        return self.get_non_free_variable_price()
-    
-    def get_fixed_price(self, _: datetime) -> float:
-        return 240.6
+    # free power 9pm to midnight
+    WEEKDAY = 'VVVVVV VVVVVV VVVVVV VVVFFF'
 PROVIDERS.append(ContactGoodNights())
-
-class ContactGoodNightsLowUser(ContactGoodNights):
-
-    def get_non_free_variable_price(self) -> float:
-        return 30.245
-    
-    def get_fixed_price(self, _: datetime) -> float:
-        return 103.5
-PROVIDERS.append(ContactGoodNightsLowUser())
+PROVIDERS.append(ContactGoodNights(low_user=True, VARIABLE=30.245, FIXED=103.5))
 
 class ContactDreamCharge(Contact):
 
-    def peak(self):
-        return 23.69
-    
-    def offpeak(self):
-        return 14.26
-
-    def get_variable_price(self, date: datetime) -> float:
-        # peak 7am-11pm
-        if (date.time() >= time(7, 0) and date.time() < time(23, 0)):
-            return self.peak()
-        else:
-            return self.offpeak()
-        
-    def get_fixed_price(self, _: datetime) -> float:
-        return 174.9
+    PEAK = 23.69
+    OFF_PEAK = 14.26
+    FIXED = 174.9
+
+    # peak 7am-11pm
+    WEEKDAY = 'OOOOOO OPPPPP PPPPPP PPPPPO'
 PROVIDERS.append(ContactDreamCharge())
-    
-class ContactDreamChargeLowUser(ContactDreamCharge):
+PROVIDERS.append(ContactDreamCharge(low_user=True, PEAK=26.795, OFF_PEAK=17.365, FIXED=103.5))
 
-    def peak(self):
-        return 26.795
-    
-    def offpeak(self):
-        return 17.365
-    
-    def get_fixed_price(self, _: datetime) -> float:
-        return 103.5
-PROVIDERS.append(ContactDreamChargeLowUser())
-    
 class ContactEverydayBonusFixed(Contact):
 
-    def get_variable_price(self, date: datetime) -> float:
-        return 20.47 + 0.161
-    
-    def get_fixed_price(self, date: datetime) -> float:
-        return 228.2
+    VARIABLE = 20.47 + 0.161
+    FIXED = 228.2
     
-    def calculate_total(self, subtotal: float) -> float:
-        # 2% discount
-        subtotal *= 0.98
-        return super().calculate_total(subtotal)
+    # 2% discount
+    SCALE = Contact.SCALE * 0.98
 PROVIDERS.append(ContactEverydayBonusFixed())
-    
-class ContactEverydayBonusLowUser(ContactEverydayBonusFixed):
-
-    def get_variable_price(self, date: datetime) -> float:
-        return 25.99 + 0.161
-    
-    def get_fixed_price(self, date: datetime) -> float:
-        return 103.5
-PROVIDERS.append(ContactEverydayBonusLowUser())
+PROVIDERS.append(ContactEverydayBonusFixed(low_user=True, name='ContactEverydayBonusLowUser', VARIABLE=25.99 + 0.161, FIXED=103.5))
     
 
 class ElectricKiwi(Provider):
 
-    def calculate_daily_total(self, half_hour_totals: list[float]) -> float:
-        # Consider free hour to be most expensive off peak
-
-        if len(half_hour_totals) != 48:
-            # print('found day with wrong number of half hours')
-            return sum(half_hour_totals)
-
-        max_hour_value = 0
-        max_hour = 0
-        for n in range(24):
-            if (n >= 7 and n < 9) or (n >= 17 and n < 21):
-                # peak
-                continue
-            hour_total = sum(half_hour_totals[n * 2:n * 2 + 2])
-            if hour_total > max_hour_value:
-                max_hour_value = hour_total
-                max_hour = n
-
-        return sum([ 
-            sum(half_hour_totals[n * 2:n * 2 + 2])
-            for n in range(24) 
-            if n != max_hour
-        ])
+    # Consider free hour to be most expensive off peak
+    FREE_HOUR = True
 
 class ElectricKiwiStayAhead(ElectricKiwi):
 
-    def get_variable_price(self, _: datetime) -> float:
-        return 27.41
+    VARIABLE = 27.41
+    FIXED = 263
 
-    def get_fixed_price(self, _: datetime) -> float:
-        return 263
-
-    def calculate_total(self, subtotal: float) -> float:
-        # Every $220 costs $200
-        return subtotal * (200/220)
+    # Every $220 costs $200
+    SCALE = 200/220
 PROVIDERS.append(ElectricKiwiStayAhead())
-    
-class ElectricKiwiStayAheadLowUser(ElectricKiwiStayAhead):
-
-    def get_variable_price(self, _: datetime) -> float:
-        return 38.85
-
-    def get_fixed_price(self, _: datetime) -> float:
-        return 37
-PROVIDERS.append(ElectricKiwiStayAheadLowUser())
+PROVIDERS.append(ElectricKiwiStayAhead(low_user=True, VARIABLE=38.85, FIXED=37))
 
 class ElectricKiwiMoveMaster(ElectricKiwi):
 
-    def peak(self):
-        return 30.56
-    
-    def night(self):
-        return 15.28
-    
-    def shoulder(self):
-        return 21.39
-
-    def get_variable_price(self, date: datetime) -> float:
-        if (date.time() >= time(7, 0) and date.time() < time(9, 0)) \
-            or (date.time() >= time(17, 0) and date.time() < time(21, 0)):
-            return self.peak()
-        if (date.time() >= time(9, 0) and date.time() < time(17,0)) \
-            or (date.time() >= time(21, 0) and date.time() < time(23, 0)):
-            # off peak shoulder
-            return self.shoulder()
-        # off peak night
-        return self.night()
-
-    def get_fixed_price(self, _: datetime) -> float:
-        return 239
-
-PROVIDERS.append(ElectricKiwiMoveMaster())
+    PEAK = 30.56
+    NIGHT = 15.28
+    SHOULDER = 21.39
+    FIXED = 239
 
-class ElectricKiwiMoveMasterLowUser(ElectricKiwiMoveMaster):
+    # off peak is shoulder 9am-5pm and 9pm-11pm, night otherwise
+    WEEKDAY = 'NNNNNN NPPSSS SSSSSP PPPSSN'
 
-    def peak(self):
-        return 44.44
-    
-    def night(self):
-        return 22.22
-    
-    def shoulder(self):
-        return 31.10
-    
-    def get_fixed_price(self, _: datetime) -> float:
-        return 34
-    
-PROVIDERS.append(ElectricKiwiMoveMasterLowUser())
+PROVIDERS.append(ElectricKiwiMoveMaster())
+PROVIDERS.append(ElectricKiwiMoveMaster(low_user=True, PEAK=44.44, NIGHT=22.22, SHOULDER=31.10, FIXED=34))
 
 
 class Frank(Provider):
 
-    def get_variable_price(self, _: datetime) -> float:
-        return 22.31
-
-    def get_fixed_price(self, _: datetime) -> float:
-        return 155.25
+    VARIABLE = 22.31
+    FIXED = 155.25
 
 PROVIDERS.append(Frank())
-
-class FrankLowUser(Frank):
-
-    def get_variable_price(self, _: datetime) -> float:
-        return 26.22
-
-    def get_fixed_price(self, _: datetime) -> float:
-        return 69
-
-PROVIDERS.append(FrankLowUser())
+PROVIDERS.append(Frank(low_user=True, VARIABLE=26.22, FIXED=69))
 
 
 class FlickOffPeak(Provider):
 
-    def peak(self):
-        return 23.38
-    
-    def offpeak(self):
-        return 13.91
-
-    def get_variable_price(self, date: datetime) -> float:
-        if (date.time() >= time(7, 0) and date.time() < time(11, 0)) \
-            or (date.time() >= time(17, 0) and date.time() < time(21, 0)):
-            return self.peak()
-        else:
-            return self.offpeak()
+    PEAK = 23.38
+    OFF_PEAK = 13.91
+    FIXED = 253
 
-    def get_fixed_price(self, _: datetime) -> float:
-        return 253
+    WEEKDAY = 'OOOOOO OPPPPO OOOOOP PPPOOO'
 
 PROVIDERS.append(FlickOffPeak())
-
-class FlickOffPeakLowUser(FlickOffPeak):
-
-    def peak(self):
-        return 30.19
-    
-    def offpeak(self):
-        return 20.72
-
-    def get_fixed_price(self, _: datetime) -> float:
-        return 103.5
+# PROVIDERS.append(FlickOffPeak(low_user=True, PEAK=30.19, OFF_PEAK=20.72, FIXED=103.5))
     
 class FlickFlat(Provider):
 
-    def get_variable_price(self, _: datetime) -> float:
-        return 16.75
-
-    def get_fixed_price(self, _: datetime) -> float:
-        return 253
+    VARIABLE = 16.75
+    FIXED = 253
     
 PROVIDERS.append(FlickFlat())
-
-class FlickFlatLowUser(FlickFlat):
-
-    def get_variable_price(self, _: datetime) -> float:
-        return 23.56
-
-    def get_fixed_price(self, _: datetime) -> float:
-        return 103.5
-    
-PROVIDERS.append(FlickFlatLowUser())
+PROVIDERS.append(FlickFlat(low_user=True, VARIABLE=23.56, FIXED=103.5))
 
 
 # class MercuryTwoYear(Provider):
 
-#     def get_variable_price(self, date: datetime) -> float:
-#         return 16.49 + 0.12
-
-#     def get_fixed_price(self, date: datetime) -> float:
-#         return 235.69
+#     VARIABLE = 16.49 + 0.12
+#     FIXED = 235.69
 
-#     def calculate_total(self, subtotal: float) -> float:
-#         return (subtotal * 0.88 * 1.15 - 10000) # * gst - discount - sign up bonus
+#     SCALE = 0.88 * 1.15 # * gst - discount
+#     OFFSET = -10000 # sign up bonus
 
 
 class OctopusFixed(Provider):
@@ -328,107 +202,236 @@ class OctopusFixed(Provider):
     PEAK = 27.416
     OFF_PEAK = 21.666
     NIGHT = 13.708
+    FIXED = 247.25
 
-    def get_variable_price(self, date: datetime) -> float:
-        if date.weekday() < 5:
-            if (date.time() >= time(7, 0) and date.time() < time(11, 0)) or \
-                (date.time() >= time(17, 0) and date.time() < time(21, 0)):
-                return self.PEAK
-            elif (date.time() >= time(11, 0) and date.time() < time(17, 0)) or \
-                (date.time() >= time(21, 0) and date.time() < time(23, 0)):
-                return self.OFF_PEAK
-            else:
-                return self.NIGHT
-        else:
-            # Weekend
-            if (date.time() >= time(7, 0) and date.time() < time(23, 0)):
-                return self.OFF_PEAK
-            else:
-                return self.NIGHT
-
-    def get_fixed_price(self, date: datetime) -> float:
-        return 247.25
+    WEEKDAY = 'NNNNNN NPPPPO OOOOOP PPPOON'
+    WEEKEND = 'NNNNNN NOOOOO OOOOOO OOOOON'
 
 PROVIDERS.append(OctopusFixed())
-
-class OctopusLowUser(OctopusFixed):
-
-    PEAK = 35.0405
-    OFF_PEAK = 29.2905
-    NIGHT = 17.526
-
-    def get_fixed_price(self, date: datetime) -> float:
-        return 103.5
-
-PROVIDERS.append(OctopusLowUser())
+PROVIDERS.append(OctopusFixed(low_user=True, name='OctopusLowUser', PEAK=35.0405, OFF_PEAK=29.2905, NIGHT=17.526, FIXED=103.5))
 
 
 class TwoDegrees(Provider):
 
-    def get_variable_price(self, _: datetime) -> float:
-        return 24.191 * 1.15
-
-    def get_fixed_price(self, _: datetime) -> float:
-        return 212.16 * 1.15
+    VARIABLE = 24.191 * 1.15
+    FIXED = 212.16 * 1.15
     
-    def calculate_total(self, subtotal: float) -> float:
-        # $20 off broadband per month
-        return subtotal - (20 * 12)
+    # $20 off broadband per month
+    OFFSET = -(20 * 12)
 
 
 PROVIDERS.append(TwoDegrees())
-
-
-class TwoDegreesLowerUser(TwoDegrees):
-
-    def get_variable_price(self, _: datetime) -> float:
-        return 32.496 * 1.15
-
-    def get_fixed_price(self, _: datetime) -> float:
-        return 30 * 1.15
-    
-PROVIDERS.append(TwoDegreesLowerUser())
+PROVIDERS.append(TwoDegrees(low_user=True, name='TwoDegreesLowerUser', VARIABLE=32.496 * 1.15, FIXED=30 * 1.15))
 
 
 DATETIME_FORMAT = r'%d/%m/%Y %H:%M:%S'
 PERIOD_START_COLUMN = 9
 PERIOD_END_COLUMN = 10
 USAGE_COLUMN = 12
-
-results = []
-
-for provider in PROVIDERS:
-    total_cost = 0
-    current_day = None
-    day_prices = []
-    with open(args.prices_file) as f:
-        reader = csv.reader(f)
-        header = next(reader)
-        period_start = datetime.now()
-        for row in reader:
-            start_str = row[PERIOD_START_COLUMN]
-            datetime_str = row[PERIOD_END_COLUMN]
-            usage = float(row[USAGE_COLUMN])
-
-            period_start = datetime.strptime(start_str, DATETIME_FORMAT)
-            period_end = datetime.strptime(datetime_str, DATETIME_FORMAT)
-            if (period_end - period_start).seconds > 3600:
+# readings covering longer than this aren't half hourly
+MAX_READING_SECONDS = 3600
+
+CACHE_PATH = Path.home() / '.cache' / 'power-prices' / 'usage.pkl'
+# bump when parsing or UsageData changes, so cached arrays from an older version aren't used
+CACHE_VERSION = 6
+
+DAYS_BEFORE_MONTH = np.array([0, 31, 59, 90, 120, 151, 181, 212, 243, 273, 304, 334])
+DAYS_IN_MONTH = np.array([31, 28, 31, 30, 31, 30, 31, 31, 30, 31, 30, 31])
+# character positions of a dd/mm/yyyy HH:MM:SS timestamp
+TIMESTAMP_FIELDS = ((0, 2), (3, 5), (6, 10), (11, 13), (14, 16), (17, 19)) # day, month, year, hour, minute, second
+TIMESTAMP_SEPARATORS = {2: ord('/'), 5: ord('/'), 10: ord(' '), 13: ord(':'), 16: ord(':')}
+
+
+def leap_days_before(year: int) -> int:
+    year = year - 1
+    return year // 4 - year // 100 + year // 400
+
+
+LEAP_DAYS_BEFORE_EPOCH = leap_days_before(1970)
+
+
+def days_since_epoch(day: int, month: int, year: int) -> int:
+    # works on ints or numpy arrays of them
+    leap_day = (month > 2) & (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+    return (year - 1970) * 365 + leap_days_before(year) - LEAP_DAYS_BEFORE_EPOCH \
+        + DAYS_BEFORE_MONTH[month - 1] + day - 1 + leap_day
+
+
+@lru_cache(maxsize=None)
+def parse_date(value: str) -> int:
+    # days since the epoch for dd/mm/yyyy, every reading in a day shares the date so it's only worked out once
+    if value[2] != '/' or value[5] != '/':
+        raise ValueError(value)
+    day, month, year = int(value[0:2]), int(value[3:5]), int(value[6:10])
+    # out of range dates would silently roll into the next month, let strptime reject them
+    if not 1 <= month <= 12 or not 1 <= day <= calendar.monthrange(year, month)[1]:
+        raise ValueError(value)
+    return int(days_since_epoch(day, month, year))
+
+
+def parse_timestamp(value: str) -> int:
+    # seconds since the epoch, slicing the fixed width dd/mm/yyyy HH:MM:SS is much faster than strptime
+    try:
+        # anything else, like a trailing AM/PM or a T separator, is left for strptime to accept or reject
+        if len(value) not in (16, 19) \
+                or any(ord(value[i]) != separator for i, separator in TIMESTAMP_SEPARATORS.items() if i < len(value)) \
+                or not ''.join(value[start:end] for start, end in TIMESTAMP_FIELDS).isdecimal():
+            raise ValueError(value)
+        days = parse_date(value[:10])
+        hour = int(value[11:13])
+        minute = int(value[14:16])
+        second = int(value[17:19]) if len(value) > 16 else 0
+        if not (0 <= hour <= 23 and 0 <= minute <= 59 and 0 <= second <= 59):
+            raise ValueError(value)
+    except (IndexError, ValueError):
+        return calendar.timegm(datetime.strptime(value, DATETIME_FORMAT).timetuple())
+    return days * 86400 + hour * 3600 + minute * 60 + second
+
+
+def parse_timestamps(values: list[bytes]) -> np.ndarray:
+    # seconds since the epoch, the whole column at once if it's all fixed width dd/mm/yyyy HH:MM:SS
+    chars = np.array(values)
+    if chars.dtype.itemsize == 19:
+        chars = chars.view(np.uint8).reshape(-1, 19)
+        digits = chars.astype(np.int64) - ord('0')
+        digit_columns = np.delete(digits, list(TIMESTAMP_SEPARATORS), axis=1)
+        if (chars[:, list(TIMESTAMP_SEPARATORS)] == list(TIMESTAMP_SEPARATORS.values())).all() \
+                and ((digit_columns >= 0) & (digit_columns <= 9)).all():
+            day, month, year, hour, minute, second = (
+                (digits[:, start:end] * 10 ** np.arange(end - start - 1, -1, -1)).sum(axis=1)
+                for start, end in TIMESTAMP_FIELDS
+            )
+            # out of range dates would silently roll into the next month, leave them to the per value parser
+            month_ok = (month >= 1) & (month <= 12)
+            leap_day = (month == 2) & (year % 4 == 0) & ((year % 100 != 0) | (year % 400 == 0))
+            month_days = DAYS_IN_MONTH[np.where(month_ok, month - 1, 0)] + leap_day
+            if (month_ok & (day >= 1) & (day <= month_days) & (hour <= 23) & (minute <= 59) & (second <= 59)).all():
+                return days_since_epoch(day, month, year) * 86400 + hour * 3600 + minute * 60 + second
+
+    return np.array([parse_timestamp(value.decode()) for value in values], dtype=np.int64)
+
+
+# hours the free hour can't be in, 7am-9am and 5pm-9pm, as a column to mask (hours, providers) totals
+FREE_HOUR_PEAK = np.isin(np.arange(24), [7, 8, 17, 18, 19, 20])[:, None]
+
+
+def calculate_free_hour_totals(half_hour_totals: np.ndarray, day_starts: np.ndarray) -> np.ndarray:
+    # most expensive off peak hour of each day, for each column of half hour totals
+    free_hour_totals = np.zeros((len(day_starts), half_hour_totals.shape[1]))
+
+    # days with the wrong number of half hours don't get a free hour
+    full_days = np.diff(day_starts, append=len(half_hour_totals)) == 48
+    hour_totals = half_hour_totals[day_starts[full_days, None] + np.arange(48)]
+    hour_totals = hour_totals.reshape(-1, 24, 2, half_hour_totals.shape[1]).sum(axis=2)
+
+    free_hour_totals[full_days] = np.where(FREE_HOUR_PEAK, -np.inf, hour_totals).max(axis=1)
+    return free_hour_totals
+
+
+def read_usage(path: str) -> tuple[list[bytes], list[bytes], list[bytes]]:
+    # plain loop over bytes with everything held in locals, so it runs well on CPython and PyPy
+    period_starts: list[bytes] = []
+    period_ends: list[bytes] = []
+    usages: list[bytes] = []
+    with open(path, 'rb') as f:
+        # skip the header, only the few columns we need are split out of each line
+        lines = f.read().splitlines()[1:]
+    try:
+        for line in lines:
+            if not line:
                 continue
-
-            if current_day is None:
-                current_day = period_start.date()
-            
-            if (period_start.date() == current_day):
-                day_prices.append(provider.get_variable_price(period_start) * usage)
-            else:
-                total_cost += provider.calculate_daily_total(day_prices) + provider.get_fixed_price(period_end)
-                day_prices = [provider.get_variable_price(period_start) * usage]
-                current_day = period_start.date()
-        total_cost += provider.calculate_daily_total(day_prices) + provider.get_fixed_price(period_start)
-    total_cost = provider.calculate_total(total_cost)
-
-    results.append((total_cost, type(provider).__name__))
-
-results.sort()
+            columns = line.split(b',', USAGE_COLUMN + 1)
+            period_starts.append(columns[PERIOD_START_COLUMN])
+            period_ends.append(columns[PERIOD_END_COLUMN])
+            usages.append(columns[USAGE_COLUMN])
+    except IndexError as e:
+        # the loop variable is still the bad line, no need to track it per row
+        raise ValueError(f'Could not parse {path} line: {line.decode(errors="replace")}') from e
+    return period_starts, period_ends, usages
+
+
+@dataclass(slots=True)
+class UsageData:
+    # one element per half hourly reading, kept in narrow dtypes as they're cached and gathered for every provider
+    slot: np.ndarray  # int16 half hour slot of the week, weekday * 48 + half hour of day
+    kwh: np.ndarray  # float32, plenty for meter readings, sums are done in float64
+    # one element per day
+    day_starts: np.ndarray  # int32 index of the day's first reading
+
+
+def parse_usage(path: str) -> UsageData:
+    period_starts, period_ends, usages = read_usage(path)
+    period_start = parse_timestamps(period_starts)
+    period_end = parse_timestamps(period_ends)
+    kwh = np.array(usages).astype(np.float32)
+
+    # only half hourly readings, skip anything covering more than an hour or ending before it starts
+    half_hourly = (period_end > period_start) & (period_end - period_start <= MAX_READING_SECONDS)
+    period_start = period_start[half_hourly]
+    kwh = kwh[half_hourly]
+    if not len(period_start):
+        raise ValueError(f'No half hourly readings in {path}')
+
+    day_id, seconds_of_day = np.divmod(period_start, 86400)
+    # 1970-01-01 was a Thursday
+    weekday = (day_id + 3) % 7
+    day_starts = np.flatnonzero(np.diff(day_id, prepend=day_id[0] - 1))
+    return UsageData(
+        slot=(weekday * 48 + seconds_of_day // 1800).astype(np.int16),
+        kwh=kwh,
+        day_starts=day_starts.astype(np.int32),
+    )
+
+
+def load_usage(path: str, use_cache: bool = True) -> UsageData:
+    # parsing is most of the run time, so keep the last file's arrays for re-runs until it changes
+    stat = os.stat(path)
+    # everything the parsed arrays depend on, not just the file
+    key = (
+        CACHE_VERSION, os.path.abspath(path), stat.st_mtime_ns, stat.st_size,
+        PERIOD_START_COLUMN, PERIOD_END_COLUMN, USAGE_COLUMN, MAX_READING_SECONDS,
+    )
+    if not use_cache:
+        return parse_usage(path)
+
+    try:
+        with open(CACHE_PATH, 'rb') as f:
+            # the key is pickled on its own ahead of the arrays, so a stale cache is never unpickled
+            if pickle.load(f) == key:
+                return pickle.load(f)
+    except Exception:
+        # corrupt or truncated, just re-parse
+        pass
+
+    usage = parse_usage(path)
+    try:
+        CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        with open(CACHE_PATH, 'wb') as f:
+            pickle.dump(key, f)
+            pickle.dump(usage, f)
+    except OSError:
+        pass
+    return usage
+
+
+usage = load_usage(args.prices_file, use_cache=not args.no_cache)
+day_starts = usage.day_starts
+
+# one column per provider
+price_tables = np.stack([provider.price_table for provider in PROVIDERS], axis=1)
+half_hour_totals = price_tables[usage.slot] * usage.kwh[:, None]
+daily_totals = np.add.reduceat(half_hour_totals, day_starts, axis=0, dtype=np.float64)
+
+free_hour = np.array([provider.FREE_HOUR for provider in PROVIDERS])
+daily_totals[:, free_hour] -= calculate_free_hour_totals(half_hour_totals[:, free_hour], day_starts)
+
+fixed = np.array([provider.FIXED for provider in PROVIDERS])
+scale = np.array([provider.SCALE for provider in PROVIDERS])
+offset = np.array([provider.OFFSET for provider in PROVIDERS])
+total_costs = (daily_totals.sum(axis=0) + len(day_starts) * fixed) * scale + offset
+
+results = list(zip(total_costs.tolist(), [provider.name for provider in PROVIDERS]))
+# ties stay in PROVIDERS order
+results.sort(key=itemgetter(0))
 for (total_cost, provider_name) in results:
     print(f'{provider_name}: {total_cost / 100:.2f}')